@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .models import User
+
+TOKEN_CACHE_TIMEOUT = 20  # seconds a resolved token is trusted without the DB
+# Distinct from the email token miss marker in accounts.tokens
+REJECTED_KEY_CACHE_TIMEOUT = 60
+REJECTED_KEY = "__none__"
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that keeps the user id of recently resolved tokens
+    (and recently rejected keys) in the cache. A cached token costs one user
+    lookup by primary key instead of the token/user join, and request.user
+    is always the current row
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = f"tok:{key}"
+        user_id = cache.get(cache_key)
+
+        if user_id == REJECTED_KEY:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        model = self.get_model()
+        if user_id is None:
+            try:
+                token = model.objects.select_related("user").get(key=key)
+            except model.DoesNotExist:
+                cache.set(cache_key, REJECTED_KEY, REJECTED_KEY_CACHE_TIMEOUT)
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            cache.set(cache_key, token.user_id, TOKEN_CACHE_TIMEOUT)
+        else:
+            try:
+                user = User.objects.get(pk=user_id)
+            except User.DoesNotExist:
+                cache.delete(cache_key)
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            token = model(key=key, user=user)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+        return (token.user, token)
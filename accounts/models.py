@@ -1,28 +1,41 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from django.core.validators import RegexValidator
-import uuid
+from django.db.models import Q
+from django.core.exceptions import ValidationError
+
+from utils.uuid7 import uuid7
+
+
+def validate_phone_number(value):
+    r"""
+    Equivalent of ^\+?[1-9]\d{8,14}$ using str methods instead of a regex
+    """
+    digits = value[1:] if value.startswith("+") else value
+    if not (9 <= len(digits) <= 15 and "1" <= digits[0] <= "9" and digits.isdecimal()):
+        raise ValidationError(
+            "Phone number must be entered in the format: '+999999999'. Up to 15 digits allowed.",
+            code="invalid",
+        )
 
 
 class User(AbstractUser):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Time-ordered ids keep inserts on the right-most leaf of users_pkey
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     email = models.EmailField(unique=True)
     first_name = models.CharField(max_length=15)
     last_name = models.CharField(max_length=255)
     phone_number = models.CharField(
         max_length=20,
-        validators=[
-            RegexValidator(
-                regex=r"^\+?[1-9]\d{8,14}$",
-                message="Phone number must be entered in the format: '+999999999'. Up to 15 digits allowed.",
-            )
-        ],
+        validators=[validate_phone_number],
     )
     is_email_verified = models.BooleanField(default=False)
-    email_verification_token = models.CharField(max_length=100, blank=True, null=True)
-    password_reset_token = models.CharField(max_length=100, blank=True, null=True)
+    # SHA-256 hex digests; the raw tokens only ever live in the emailed links
+    email_verification_token_hash = models.CharField(
+        max_length=64, blank=True, null=True
+    )
+    password_reset_token_hash = models.CharField(max_length=64, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    stripe_customer_id = models.CharField(null=True)
+    stripe_customer_id = models.CharField(null=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     USERNAME_FIELD = "email"
@@ -30,3 +43,17 @@ class User(AbstractUser):
 
     class Meta:
         db_table = "users"
+        indexes = [
+            # Tokens are cleared once used, so most rows are NULL; only index
+            # live ones
+            models.Index(
+                fields=["email_verification_token_hash"],
+                name="u_evt_idx",
+                condition=Q(email_verification_token_hash__isnull=False),
+            ),
+            models.Index(
+                fields=["password_reset_token_hash"],
+                name="u_prt_idx",
+                condition=Q(password_reset_token_hash__isnull=False),
+            ),
+        ]
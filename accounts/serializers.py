@@ -1,12 +1,12 @@
-import uuid
-
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
 from rest_framework import serializers
 
 from shipper.models import Company
 
 from .models import User
+from .tokens import generate_token, token_known_invalid
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -32,6 +32,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             "primary_ships_country",
         ]
 
+    @transaction.atomic
     def create(self, validated_data):
         company_name = validated_data.pop("company_name")
         primary_ships_country = validated_data.pop(
@@ -39,6 +40,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         )
 
         # Create user
+        verification_token, verification_token_hash = generate_token()
         user = User.objects.create_user(
             username=validated_data["email"],
             email=validated_data["email"],
@@ -46,8 +48,10 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             last_name=validated_data["last_name"],
             phone_number=validated_data["phone_number"],
             password=validated_data["password"],
-            email_verification_token=str(uuid.uuid4()),
+            email_verification_token_hash=verification_token_hash,
         )
+        # Keep the raw token around so the verification email can link to it
+        user.verification_token = verification_token
 
         # Create company
         Company.objects.create(
@@ -82,9 +86,7 @@ class PasswordResetSerializer(serializers.Serializer):
     email = serializers.EmailField()
 
     def validate_email(self, value):
-        try:
-            user = User.objects.get(email=value)
-        except User.DoesNotExist:
+        if not User.objects.filter(email=value).exists():
             raise serializers.ValidationError("User with this email does not exist.")
         return value
 
@@ -94,9 +96,8 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
     password = serializers.CharField(validators=[validate_password])
 
     def validate_token(self, value):
-        try:
-            user = User.objects.get(password_reset_token=value)
-        except User.DoesNotExist:
+        # Only recent misses are rejected here; the view's UPDATE decides
+        if token_known_invalid("prt", value):
             raise serializers.ValidationError("Invalid token.")
         return value
 
@@ -119,20 +120,22 @@ class UserSerializer(serializers.ModelSerializer):
         ]
 
     def get_company(self, obj):
-        if hasattr(obj, "company"):
+        company = getattr(obj, "company", None)
+        if company is not None:
             return {
-                "name": obj.company.name,
-                "location": obj.company.location,
-                "primary_ships_country": obj.company.primary_ships_country,
+                "name": company.name,
+                "location": company.location,
+                "primary_ships_country": company.primary_ships_country,
             }
         return None
 
     def get_shipping_needs(self, obj):
-        if hasattr(obj, "shipping_needs"):
+        shipping_needs = getattr(obj, "shipping_needs", None)
+        if shipping_needs is not None:
             return {
-                "mode": obj.shipping_needs.mode,
-                "average_ftl": obj.shipping_needs.average_ftl,
-                "trailer_type": obj.shipping_needs.trailer_type,
+                "mode": shipping_needs.mode,
+                "average_ftl": shipping_needs.average_ftl,
+                "trailer_type": shipping_needs.trailer_type,
             }
         return None
 
@@ -141,9 +144,8 @@ class EmailVerificationSerializer(serializers.Serializer):
     token = serializers.CharField()
 
     def validate_token(self, value):
-        try:
-            user = User.objects.get(email_verification_token=value)
-        except User.DoesNotExist:
+        # Only recent misses are rejected here; the view's UPDATE decides
+        if token_known_invalid("evt", value):
             raise serializers.ValidationError(
                 "Invalid verification token or email is already verified."
             )
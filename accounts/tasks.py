@@ -0,0 +1,68 @@
+from functools import lru_cache
+
+import resend
+from django.conf import settings
+from django.template.loader import get_template
+
+from .models import User
+
+resend.api_key = settings.RESEND_API_KEY
+
+
+@lru_cache(maxsize=None)
+def _verification_template():
+    """Load and compile the verification email template once per process"""
+    return get_template("verification_email.html")
+
+
+def send_verification_email_task(user_id, token):
+    """
+    Load the user and send the verification email, off the request thread
+    """
+    user = User.objects.only("email", "first_name").get(pk=user_id)
+    send_verification_email(user, token)
+
+
+def send_verification_email(user, token):
+    """
+    Send email verification email
+    """
+    subject = "Verify your ShipOrbit account"
+    # message = f'Click the link to verify your account: {settings.FRONTEND_URL}/verify-email/{token}'
+    html_message = _verification_template().render(
+        {
+            "first_name": user.first_name,
+            "verify_link": f"{settings.FRONTEND_URL}/verify-email/{token}",
+        },
+    )
+    from_email = settings.DEFAULT_FROM_EMAIL
+    recipient_list = [user.email]
+    resend.Emails.send(
+        {
+            "from": from_email,
+            "to": recipient_list,
+            "subject": subject,
+            "html": html_message,
+        }
+    )
+    pass
+
+
+def send_password_reset_email(user, token):
+    """
+    Send password reset email
+    """
+    subject = "Reset your ShipOrbit password"
+    message = f"Click the link to reset your password: {settings.FRONTEND_URL}/reset-password/{token}"
+    from_email = settings.DEFAULT_FROM_EMAIL
+    recipient_list = [user.email]
+
+    resend.Emails.send(
+        {
+            "from": from_email,
+            "to": recipient_list,
+            "subject": subject,
+            "html": message,
+        }
+    )
+    pass
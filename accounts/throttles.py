@@ -0,0 +1,16 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenCheckRateThrottle(SimpleRateThrottle):
+    """
+    Per-client limit on endpoints that look up emailed tokens, to slow down
+    token guessing
+    """
+
+    scope = "token_check"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": self.get_ident(request),
+        }
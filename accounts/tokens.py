@@ -0,0 +1,43 @@
+import hashlib
+import secrets
+
+from django.core.cache import cache
+
+
+def hash_token(token):
+    """Return the hex SHA-256 digest stored in place of a raw token"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def generate_token():
+    """
+    Generate a URL-safe token for email links
+    Returns: (raw token to send to the user, hash to store on the user row)
+    """
+    token = secrets.token_urlsafe(32)
+    return token, hash_token(token)
+
+
+INVALID_TOKEN_CACHE_TIMEOUT = 30
+INVALID_TOKEN = "__miss__"
+
+
+def _invalid_token_cache_key(cache_prefix, token):
+    return f"{cache_prefix}:{hash_token(token)}"
+
+
+def token_known_invalid(cache_prefix, token):
+    """
+    Whether this emailed token was recently found not to match any user.
+    Fresh tokens are random, so a cached miss can't hide one
+    """
+    return cache.get(_invalid_token_cache_key(cache_prefix, token)) == INVALID_TOKEN
+
+
+def remember_invalid_token(cache_prefix, token):
+    """Cache a miss briefly so repeated bogus tokens skip the database"""
+    cache.set(
+        _invalid_token_cache_key(cache_prefix, token),
+        INVALID_TOKEN,
+        INVALID_TOKEN_CACHE_TIMEOUT,
+    )
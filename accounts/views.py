@@ -1,14 +1,19 @@
-import uuid
-
-import resend
-from django.conf import settings
 from django.contrib.auth import login
-from django.template.loader import render_to_string
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import permissions, status
 from rest_framework.authtoken.models import Token
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import (
+    api_view,
+    permission_classes,
+    throttle_classes,
+)
 from rest_framework.response import Response
 
+from payments.tasks import create_stripe_customer_task
+from utils.background import run_in_background
+
 from .models import User
 from .serializers import (
     EmailVerificationSerializer,
@@ -18,8 +23,12 @@ from .serializers import (
     UserRegistrationSerializer,
     UserSerializer,
 )
-
-resend.api_key = settings.RESEND_API_KEY
+from .tasks import (
+    send_password_reset_email,
+    send_verification_email_task,
+)
+from .throttles import TokenCheckRateThrottle
+from .tokens import generate_token, hash_token, remember_invalid_token
 
 
 @api_view(["POST"])
@@ -30,19 +39,27 @@ def register(request):
     """
     serializer = UserRegistrationSerializer(data=request.data)
     if serializer.is_valid():
-        user = serializer.save()
-        login(request, user)
+        with transaction.atomic():
+            user = serializer.save()
+
+            # Create or get token
+            token, created = Token.objects.get_or_create(user=user)
+
+            # Email and set up the Stripe customer from worker threads once
+            # the user is committed
+            transaction.on_commit(
+                lambda: run_in_background(
+                    send_verification_email_task, user.pk, user.verification_token
+                )
+            )
+            transaction.on_commit(
+                lambda: run_in_background(create_stripe_customer_task, user.pk)
+            )
 
-        # Create or get token
-        token, created = Token.objects.get_or_create(user=user)
+        login(request, user)
 
         user_serializer = UserSerializer(user)
 
-        try:
-            send_verification_email(user)
-        except Exception:
-            pass
-
         return Response(
             {
                 "message": "User registered successfully",
@@ -92,12 +109,14 @@ def password_reset_request(request):
     serializer = PasswordResetSerializer(data=request.data)
     if serializer.is_valid():
         email = serializer.validated_data["email"]
-        user = User.objects.get(email=email)
+        user = User.objects.only("id", "email", "password_reset_token_hash").get(
+            email=email
+        )
 
         # Generate reset token
-        reset_token = str(uuid.uuid4())
-        user.password_reset_token = reset_token
-        user.save()
+        reset_token, reset_token_hash = generate_token()
+        user.password_reset_token_hash = reset_token_hash
+        user.save(update_fields=["password_reset_token_hash", "updated_at"])
 
         try:
             send_password_reset_email(user, reset_token)
@@ -117,6 +136,7 @@ def password_reset_request(request):
 
 @api_view(["POST"])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([TokenCheckRateThrottle])
 def password_reset_confirm(request):
     """
     Handle password reset confirmation
@@ -126,10 +146,20 @@ def password_reset_confirm(request):
         token = serializer.validated_data["token"]
         password = serializer.validated_data["password"]
 
-        user = User.objects.get(password_reset_token=token)
-        user.set_password(password)
-        user.password_reset_token = None
-        user.save()
+        # Consume the token and set the password in a single UPDATE
+        updated = User.objects.filter(
+            password_reset_token_hash=hash_token(token)
+        ).update(
+            password=make_password(password),
+            password_reset_token_hash=None,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            remember_invalid_token("prt", token)
+            return Response(
+                {"errors": {"token": ["Invalid token."]}},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         return Response(
             {"message": "Password reset successfully"}, status=status.HTTP_200_OK
@@ -140,6 +170,7 @@ def password_reset_confirm(request):
 
 @api_view(["POST"])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([TokenCheckRateThrottle])
 def verify_email(request):
     """
     Handle email verification
@@ -147,17 +178,27 @@ def verify_email(request):
     serializer = EmailVerificationSerializer(data=request.data)
     if serializer.is_valid():
         token = serializer.validated_data["token"]
-        user = User.objects.get(email_verification_token=token)
-
-        if user.is_email_verified:
+        # Consume the token and mark the email verified in a single UPDATE
+        updated = User.objects.filter(
+            email_verification_token_hash=hash_token(token)
+        ).update(
+            is_email_verified=True,
+            email_verification_token_hash=None,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            remember_invalid_token("evt", token)
             return Response(
-                {"message": "Email already verified"}, status=status.HTTP_200_OK
+                {
+                    "errors": {
+                        "token": [
+                            "Invalid verification token or email is already verified."
+                        ]
+                    }
+                },
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        user.is_email_verified = True
-        user.email_verification_token = None
-        user.save()
-
         return Response(
             {"message": "Email verified successfully"}, status=status.HTTP_200_OK
         )
@@ -170,38 +211,26 @@ def resend_verification_email(request):
     """
     Resend email verification
     """
-    email = request.user
+    user = request.user
 
-    if not email:
+    if user.is_email_verified:
         return Response(
-            {"message": "Email is required"}, status=status.HTTP_400_BAD_REQUEST
+            {"message": "Email already verified"}, status=status.HTTP_200_OK
         )
 
-    try:
-        user = User.objects.get(email=email)
-        if user.is_email_verified:
-            return Response(
-                {"message": "Email already verified"}, status=status.HTTP_200_OK
-            )
-
-        # Generate new verification token
-        user.email_verification_token = str(uuid.uuid4())
-        user.save()
-        try:
-            send_verification_email(user)
-        except Exception:
-            return Response(
-                {"message": "Please Try again later"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
-
-        return Response(
-            {"message": "Verification email sent successfully"},
-            status=status.HTTP_200_OK,
+    # Generate new verification token
+    verification_token, user.email_verification_token_hash = generate_token()
+    user.save(update_fields=["email_verification_token_hash", "updated_at"])
+    transaction.on_commit(
+        lambda: run_in_background(
+            send_verification_email_task, user.pk, verification_token
         )
+    )
 
-    except User.DoesNotExist:
-        return Response({"message": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(
+        {"message": "Verification email sent successfully"},
+        status=status.HTTP_200_OK,
+    )
 
 
 @api_view(["GET"])
@@ -210,52 +239,8 @@ def user_profile(request):
     """
     Get user profile
     """
-    serializer = UserSerializer(request.user)
-    return Response(serializer.data, status=status.HTTP_200_OK)
-
-
-# Helper functions (to be implemented)
-def send_verification_email(user):
-    """
-    Send email verification email
-    """
-    subject = "Verify your ShipOrbit account"
-    # message = f'Click the link to verify your account: {settings.FRONTEND_URL}/verify-email/{user.email_verification_token}'
-    html_message = render_to_string(
-        "verification_email.html",
-        {
-            "first_name": user.first_name,
-            "verify_link": f"{settings.FRONTEND_URL}/verify-email/{user.email_verification_token}",
-        },
-    )
-    from_email = settings.DEFAULT_FROM_EMAIL
-    recipient_list = [user.email]
-    resend.Emails.send(
-        {
-            "from": from_email,
-            "to": recipient_list,
-            "subject": subject,
-            "html": html_message,
-        }
+    user = User.objects.select_related("company", "shipping_needs").get(
+        pk=request.user.pk
     )
-    pass
-
-
-def send_password_reset_email(user, token):
-    """
-    Send password reset email
-    """
-    subject = "Reset your ShipOrbit password"
-    message = f"Click the link to reset your password: {settings.FRONTEND_URL}/reset-password/{token}"
-    from_email = settings.DEFAULT_FROM_EMAIL
-    recipient_list = [user.email]
-
-    resend.Emails.send(
-        {
-            "from": from_email,
-            "to": recipient_list,
-            "subject": subject,
-            "html": message,
-        }
-    )
-    pass
+    serializer = UserSerializer(user)
+    return Response(serializer.data, status=status.HTTP_200_OK)
@@ -1,6 +1,8 @@
+import secrets
 from decimal import Decimal
 
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 
 
 class Invoice(models.Model):
@@ -21,6 +23,7 @@ class Invoice(models.Model):
         max_digits=10, decimal_places=2, default=Decimal("0.00")
     )
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    total_amount_cents = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     paid_at = models.DateTimeField(null=True, blank=True)
 
@@ -30,12 +33,21 @@ class Invoice(models.Model):
     def save(self, *args, **kwargs):
         if not self.invoice_number:
             # Generate invoice number
-            import uuid
+            self.invoice_number = f"INV-{secrets.token_hex(4).upper()}"
 
-            self.invoice_number = f"INV-{uuid.uuid4().hex[:8].upper()}"
-
-        # Calculate total amount
-        self.total_amount = self.amount + self.driver_assist_fee
+        # Calculate total amount, unless this save only touches other columns
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"amount", "driver_assist_fee"} & set(
+            update_fields
+        ):
+            self.total_amount = self.amount + self.driver_assist_fee
+            self.total_amount_cents = int(self.total_amount * 100)
+            if update_fields is not None:
+                kwargs["update_fields"] = {
+                    *update_fields,
+                    "total_amount",
+                    "total_amount_cents",
+                }
         super().save(*args, **kwargs)
 
     class Meta:
@@ -72,6 +84,40 @@ class Payment(models.Model):
     def __str__(self):
         return f"Payment {self.id} - {self.status}"
 
+    def mark_succeeded(self):
+        """Mark payment succeeded, its invoice paid and its shipment in progress"""
+        with transaction.atomic():
+            self.status = "succeeded"
+            self.save(update_fields=["status", "updated_at"])
+
+            # Update invoice
+            invoice = self.invoice
+            invoice.status = "paid"
+            invoice.paid_at = timezone.now()
+            invoice.save(update_fields=["status", "paid_at"])
+
+            # Update shipment status to in progress
+            invoice.shipment.status = "inprogress"
+            invoice.shipment.save(update_fields=["status", "updated_at"])
+
     class Meta:
         db_table = "payments"
         verbose_name_plural = "payments"
+        indexes = [
+            models.Index(fields=["invoice", "created_at"]),
+        ]
+
+
+class StripeWebhookEvent(models.Model):
+    """Stripe events already applied, so redeliveries are skipped"""
+
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "stripe_webhook_events"
+        verbose_name_plural = "stripe_webhook_events"
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id}"
@@ -1,22 +1,43 @@
 from decimal import Decimal
+from types import MappingProxyType
 
 import stripe
 from django.utils import timezone
 from rest_framework import serializers
 
-from be import settings
+from accounts.models import User
 from shipper.models import Shipment
+from shipper.util.calculate_base_price import DRIVER_ASSIST_FEE
 
 from .models import (
     Invoice,
     Payment,
 )
+from .tasks import create_stripe_customer
+
+ZERO_AMOUNT = Decimal("0.00")
+
+# Stripe PaymentIntent status -> our Payment model status
+STRIPE_STATUS_MAP = MappingProxyType(
+    {
+        "requires_payment_method": "failed",
+        "requires_confirmation": "pending",
+        "requires_action": "requires_action",
+        "processing": "processing",
+        "succeeded": "succeeded",
+        "canceled": "cancelled",
+    }
+)
+
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+def _map_stripe_status(stripe_status):
+    """Map Stripe status to our Payment model status"""
+    return STRIPE_STATUS_MAP.get(stripe_status, "pending")
 
 
 class InvoiceSerializer(serializers.ModelSerializer):
-    shipment_id = serializers.IntegerField(source="shipment.id", read_only=True)
+    # The FK column, so rendering it doesn't need the shipment loaded
+    shipment_id = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Invoice
@@ -47,25 +68,25 @@ class InvoiceCreateSerializer(serializers.Serializer):
     def validate_shipment_id(self, value):
         user = self.context["request"].user
         try:
-            shipment = Shipment.objects.get(id=value, user=user)
+            shipment = Shipment.objects.select_related("invoice").get(
+                id=value, user=user
+            )
             if hasattr(shipment, "invoice"):
                 raise serializers.ValidationError(
                     "Invoice already exists for this shipment"
                 )
+            self._shipment = shipment
             return value
         except Shipment.DoesNotExist:
             raise serializers.ValidationError("Shipment not found")
 
     def create(self, validated_data):
-        user = self.context["request"].user
-        shipment = Shipment.objects.get(id=validated_data["shipment_id"], user=user)
+        shipment = self._shipment
         include_driver_assist = validated_data.get("include_driver_assist", False)
 
         # Calculate amount from shipment
-        amount = shipment.base_price or Decimal("0.00")
-        driver_assist_fee = (
-            Decimal("150.00") if include_driver_assist else Decimal("0.00")
-        )
+        amount = shipment.base_price or ZERO_AMOUNT
+        driver_assist_fee = DRIVER_ASSIST_FEE if include_driver_assist else ZERO_AMOUNT
 
         invoice = Invoice.objects.create(
             shipment=shipment, amount=amount, driver_assist_fee=driver_assist_fee
@@ -88,7 +109,9 @@ class PaymentIntentCreateSerializer(serializers.Serializer):
     def validate_shipment_id(self, value):
         user = self.context["request"].user
         try:
-            shipment = Shipment.objects.get(id=value, user=user)
+            shipment = Shipment.objects.select_related("invoice").get(
+                id=value, user=user
+            )
             if shipment.status != "upcoming":
                 raise serializers.ValidationError(
                     "Shipment must have 'upcoming' status to create payment"
@@ -97,13 +120,14 @@ class PaymentIntentCreateSerializer(serializers.Serializer):
                 raise serializers.ValidationError(
                     "Invoice must be in pending status to create payment intent"
                 )
+            self._shipment = shipment
             return value
         except Shipment.DoesNotExist:
             raise serializers.ValidationError("Shipment not found")
 
     def create(self, validated_data):
         user = self.context["request"].user
-        shipment = Shipment.objects.get(id=validated_data["shipment_id"], user=user)
+        shipment = self._shipment
         payment_method_id = validated_data["payment_method_id"]
         confirm = validated_data.get("confirm", True)
         return_url = validated_data.get(
@@ -115,9 +139,9 @@ class PaymentIntentCreateSerializer(serializers.Serializer):
         if hasattr(shipment, "invoice"):
             invoice = shipment.invoice
         else:
-            amount = shipment.base_price or Decimal("0.00")
+            amount = shipment.base_price or ZERO_AMOUNT
             driver_assist_fee = (
-                Decimal("150.00") if include_driver_assist else Decimal("0.00")
+                DRIVER_ASSIST_FEE if include_driver_assist else ZERO_AMOUNT
             )
 
             invoice = Invoice.objects.create(
@@ -128,23 +152,28 @@ class PaymentIntentCreateSerializer(serializers.Serializer):
             )
 
         try:
-            # Create Stripe customer if doesn't exist
+            # Create Stripe customer if doesn't exist (normally done at signup)
             customer_id = None
             if hasattr(user, "stripe_customer_id") and user.stripe_customer_id:
                 customer_id = user.stripe_customer_id
             else:
-                customer = stripe.Customer.create(
-                    email=user.email,
-                    name=f"{user.first_name} {user.last_name}".strip() or user.username,
-                )
-                customer_id = customer.id
-                # Save customer ID (you'll need to add this field to User model or UserProfile)
+                customer_id = create_stripe_customer(user).id
+                # Same guarded UPDATE as the signup task; if it stored an id
+                # meanwhile, use that one so the user keeps a single customer
+                stored = User.objects.filter(
+                    pk=user.pk, stripe_customer_id__isnull=True
+                ).update(stripe_customer_id=customer_id, updated_at=timezone.now())
+                if not stored:
+                    customer_id = User.objects.values_list(
+                        "stripe_customer_id", flat=True
+                    ).get(pk=user.pk)
                 user.stripe_customer_id = customer_id
-                user.save()
 
-            # Create PaymentIntent
+            # Create PaymentIntent. Invoices saved before total_amount_cents
+            # existed hold 0 there, so derive the cents from the total
+            amount_cents = invoice.total_amount_cents or int(invoice.total_amount * 100)
             intent_data = {
-                "amount": int(invoice.total_amount * 100),  # Convert to cents
+                "amount": amount_cents,
                 "currency": "usd",
                 "customer": customer_id,
                 "payment_method": payment_method_id,
@@ -166,26 +195,29 @@ class PaymentIntentCreateSerializer(serializers.Serializer):
 
             intent = stripe.PaymentIntent.create(**intent_data)
 
+            # Work out the final status first so the record is written once
+            payment_status = _map_stripe_status(intent.status)
+            failure_reason = ""
+            if intent.status in ["requires_action", "requires_source_action"]:
+                payment_status = "requires_action"
+            elif intent.status == "requires_payment_method":
+                payment_status = "failed"
+                failure_reason = "Payment method declined"
+
             # Create Payment record
             payment = Payment.objects.create(
                 invoice=invoice,
                 stripe_payment_intent_id=intent.id,
                 stripe_payment_method_id=payment_method_id,
                 amount=invoice.total_amount,
-                status=self._map_stripe_status(intent.status),
+                status=payment_status,
+                failure_reason=failure_reason,
                 client_secret=intent.client_secret,
             )
 
-            # Handle different payment intent statuses
+            # Handle successful payment
             if intent.status == "succeeded":
-                self._mark_payment_successful(payment, invoice)
-            elif intent.status in ["requires_action", "requires_source_action"]:
-                payment.status = "requires_action"
-                payment.save()
-            elif intent.status == "requires_payment_method":
-                payment.status = "failed"
-                payment.failure_reason = "Payment method declined"
-                payment.save()
+                payment.mark_succeeded()
 
             return {
                 "payment": payment,
@@ -204,32 +236,6 @@ class PaymentIntentCreateSerializer(serializers.Serializer):
                 invoice.delete()
             raise serializers.ValidationError(f"Payment failed: {str(e)}")
 
-    def _mark_payment_successful(self, payment, invoice):
-        """Mark payment and invoice as successful"""
-        payment.status = "succeeded"
-        payment.save()
-
-        # Update invoice
-        invoice.status = "paid"
-        invoice.paid_at = timezone.now()
-        invoice.save()
-
-        # Update shipment status to in progress
-        invoice.shipment.status = "inprogress"
-        invoice.shipment.save()
-
-    def _map_stripe_status(self, stripe_status):
-        """Map Stripe status to our Payment model status"""
-        status_mapping = {
-            "requires_payment_method": "failed",
-            "requires_confirmation": "pending",
-            "requires_action": "requires_action",
-            "processing": "processing",
-            "succeeded": "succeeded",
-            "canceled": "cancelled",
-        }
-        return status_mapping.get(stripe_status, "pending")
-
 
 class PaymentConfirmSerializer(serializers.Serializer):
     payment_intent_id = serializers.CharField(max_length=255)
@@ -237,32 +243,34 @@ class PaymentConfirmSerializer(serializers.Serializer):
     def validate_payment_intent_id(self, value):
         user = self.context["request"].user
         try:
-            Payment.objects.get(
-                stripe_payment_intent_id=value, invoice__shipment__user=user
+            # Unique lookup, then check ownership on the joined shipment
+            payment = Payment.objects.select_related("invoice__shipment").get(
+                stripe_payment_intent_id=value
             )
-            return value
         except Payment.DoesNotExist:
             raise serializers.ValidationError("Payment not found")
+        if payment.invoice.shipment.user_id != user.id:
+            raise serializers.ValidationError("Payment not found")
+        self._payment = payment
+        return value
 
     def confirm_payment(self):
-        user = self.context["request"].user
         payment_intent_id = self.validated_data["payment_intent_id"]
 
         try:
             # Confirm the PaymentIntent
             intent = stripe.PaymentIntent.confirm(payment_intent_id)
 
-            # Update local payment record
-            payment = Payment.objects.get(
-                stripe_payment_intent_id=payment_intent_id, invoice__shipment__user=user
-            )
-
-            payment.status = self._map_stripe_status(intent.status)
-            payment.save()
+            # Update local payment record, writing only what changed
+            payment = self._payment
 
-            # Handle successful payment
             if intent.status == "succeeded":
-                self._mark_payment_successful(payment, payment.invoice)
+                payment.mark_succeeded()
+            else:
+                new_status = _map_stripe_status(intent.status)
+                if payment.status != new_status:
+                    payment.status = new_status
+                    payment.save(update_fields=["status", "updated_at"])
 
             return {
                 "payment": payment,
@@ -277,38 +285,12 @@ class PaymentConfirmSerializer(serializers.Serializer):
         except stripe.error.StripeError as e:
             raise serializers.ValidationError(f"Payment confirmation failed: {str(e)}")
 
-    def _map_stripe_status(self, stripe_status):
-        """Map Stripe status to our Payment model status"""
-        status_mapping = {
-            "requires_payment_method": "failed",
-            "requires_confirmation": "pending",
-            "requires_action": "requires_action",
-            "processing": "processing",
-            "succeeded": "succeeded",
-            "canceled": "cancelled",
-        }
-        return status_mapping.get(stripe_status, "pending")
-
-    def _mark_payment_successful(self, payment, invoice):
-        """Mark payment and invoice as successful"""
-        payment.status = "succeeded"
-        payment.save()
-
-        # Update invoice
-        invoice.status = "paid"
-        invoice.paid_at = timezone.now()
-        invoice.save()
-
-        # Update shipment status to in progress
-        invoice.shipment.status = "inprogress"
-        invoice.shipment.save()
-
 
 class PaymentSerializer(serializers.ModelSerializer):
     invoice_number = serializers.CharField(
         source="invoice.invoice_number", read_only=True
     )
-    shipment_id = serializers.IntegerField(source="invoice.shipment.id", read_only=True)
+    shipment_id = serializers.IntegerField(source="invoice.shipment_id", read_only=True)
 
     class Meta:
         model = Payment
@@ -323,3 +305,39 @@ class PaymentSerializer(serializers.ModelSerializer):
             "updated_at",
         ]
         read_only_fields = ["id", "created_at", "updated_at"]
+
+
+# Field instances reused to format values() rows the way PaymentSerializer does
+_AMOUNT_FIELD = serializers.DecimalField(max_digits=10, decimal_places=2)
+_DATETIME_FIELD = serializers.DateTimeField()
+
+PAYMENT_HISTORY_VALUES = (
+    "id",
+    "invoice__invoice_number",
+    "invoice__shipment_id",
+    "amount",
+    "status",
+    "failure_reason",
+    "created_at",
+    "updated_at",
+)
+
+
+def payment_history_data(rows):
+    """
+    PaymentSerializer's output for values(*PAYMENT_HISTORY_VALUES) rows,
+    without building model instances per payment
+    """
+    return [
+        {
+            "id": row["id"],
+            "invoice_number": row["invoice__invoice_number"],
+            "shipment_id": int(row["invoice__shipment_id"]),
+            "amount": _AMOUNT_FIELD.to_representation(row["amount"]),
+            "status": row["status"],
+            "failure_reason": row["failure_reason"],
+            "created_at": _DATETIME_FIELD.to_representation(row["created_at"]),
+            "updated_at": _DATETIME_FIELD.to_representation(row["updated_at"]),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,82 @@
+import stripe
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from shipper.models import Shipment
+
+from .models import Invoice, Payment, StripeWebhookEvent
+
+
+def create_stripe_customer(user):
+    """Create the Stripe customer for a user"""
+    return stripe.Customer.create(
+        email=user.email,
+        name=f"{user.first_name} {user.last_name}".strip() or user.username,
+    )
+
+
+def create_stripe_customer_task(user_id):
+    """
+    Create a new user's Stripe customer ahead of their first payment
+    """
+    user = User.objects.only(
+        "email", "first_name", "last_name", "username", "stripe_customer_id"
+    ).get(pk=user_id)
+    if user.stripe_customer_id:
+        return
+
+    customer = create_stripe_customer(user)
+    # Plain UPDATE; don't overwrite an id the payment path may have saved meanwhile
+    User.objects.filter(pk=user_id, stripe_customer_id__isnull=True).update(
+        stripe_customer_id=customer.id
+    )
+
+
+def process_stripe_event(event_id, event_type, payment_intent):
+    """
+    Apply a verified Stripe webhook event to our payment records, once per
+    event id. Stripe delivers at least once; a redelivered event finds its
+    row and does nothing. The row commits with the updates and the webhook
+    acks only after this returns, so an event that fails to apply rolls
+    back and Stripe redelivers it
+    """
+    with transaction.atomic():
+        _, created = StripeWebhookEvent.objects.get_or_create(
+            event_id=event_id, defaults={"event_type": event_type}
+        )
+        if created:
+            _apply_payment_intent_event(event_type, payment_intent)
+
+
+def _apply_payment_intent_event(event_type, payment_intent):
+    if event_type == "payment_intent.succeeded":
+        intent_id = payment_intent["id"]
+        now = timezone.now()
+
+        # Flip payment, invoice and shipment straight in the database, in the
+        # caller's transaction; an unknown intent simply updates nothing
+        Payment.objects.filter(stripe_payment_intent_id=intent_id).update(
+            status="succeeded", updated_at=now
+        )
+        Invoice.objects.filter(payments__stripe_payment_intent_id=intent_id).update(
+            status="paid", paid_at=now
+        )
+        Shipment.objects.filter(
+            invoice__payments__stripe_payment_intent_id=intent_id
+        ).update(status="inprogress", updated_at=now)
+
+    elif event_type == "payment_intent.payment_failed":
+        Payment.objects.filter(stripe_payment_intent_id=payment_intent["id"]).update(
+            status="failed",
+            # Stripe sends last_payment_error as null when there is none
+            failure_reason=(payment_intent.get("last_payment_error") or {}).get(
+                "message", "Unknown error"
+            ),
+            updated_at=timezone.now(),
+        )
+
+    elif event_type == "payment_intent.requires_action":
+        Payment.objects.filter(stripe_payment_intent_id=payment_intent["id"]).update(
+            status="requires_action", updated_at=timezone.now()
+        )
@@ -1,3 +1,50 @@
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import User
+from shipper.models import Shipment
+
+from .models import Invoice, Payment
+from .serializers import (
+    PAYMENT_HISTORY_VALUES,
+    PaymentSerializer,
+    payment_history_data,
+)
+
+
+class PaymentHistoryDataTests(TestCase):
+    """payment_history_data must keep PaymentSerializer's output"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="payer", email="payer@example.com", password="pw"
+        )
+        shipment = Shipment.objects.create(user=cls.user, base_price=Decimal("900"))
+        invoice = Invoice.objects.create(
+            shipment=shipment, amount=Decimal("900"), status="pending"
+        )
+        Payment.objects.create(
+            invoice=invoice,
+            stripe_payment_intent_id="pi_failed",
+            amount=Decimal("900.00"),
+            status="failed",
+            failure_reason="Payment method declined",
+        )
+        Payment.objects.create(
+            invoice=invoice,
+            stripe_payment_intent_id="pi_succeeded",
+            amount=Decimal("900.5"),
+            status="succeeded",
+        )
+
+    def test_matches_serializer(self):
+        payments = Payment.objects.filter(invoice__shipment__user=self.user).order_by(
+            "-created_at", "id"
+        )
+
+        self.assertEqual(
+            payment_history_data(payments.values(*PAYMENT_HISTORY_VALUES)),
+            PaymentSerializer(payments, many=True).data,
+        )
@@ -25,7 +25,9 @@ urlpatterns = [
         views.payment_status,
         name="payment-status",
     ),
-    path("payments/history/", views.payment_history, name="payment-history"),
+    path(
+        "payments/history/", views.PaymentHistoryView.as_view(), name="payment-history"
+    ),
     # Stripe Webhook
     path("webhooks/stripe/", views.stripe_webhook, name="stripe-webhook"),
 ]
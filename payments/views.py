@@ -1,5 +1,6 @@
 import stripe
-from django.utils import timezone
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseBadRequest
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -12,12 +13,21 @@ from .models import (
     Payment,
 )
 from .serializers import (
+    PAYMENT_HISTORY_VALUES,
+    STRIPE_STATUS_MAP,
     InvoiceCreateSerializer,
     InvoiceSerializer,
     PaymentConfirmSerializer,
     PaymentIntentCreateSerializer,
     PaymentSerializer,
+    payment_history_data,
 )
+from .tasks import process_stripe_event
+
+INTENT_STATUS_CACHE_TIMEOUT = 3  # seconds, absorbs client polling bursts
+
+# Local statuses Stripe can't move on from, with the Stripe status they came from
+TERMINAL_INTENT_STATUSES = {"succeeded": "succeeded", "cancelled": "canceled"}
 
 
 class InvoiceListCreateView(generics.ListCreateAPIView):
@@ -34,9 +44,7 @@ class InvoiceListCreateView(generics.ListCreateAPIView):
         return InvoiceSerializer
 
     def get_queryset(self):
-        return Invoice.objects.filter(shipment__user=self.request.user).select_related(
-            "shipment"
-        )
+        return Invoice.objects.filter(shipment__user=self.request.user)
 
 
 class InvoiceDetailView(generics.RetrieveAPIView):
@@ -107,20 +115,40 @@ def confirm_payment_intent(request):
     return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(["GET"])
-@permission_classes([IsAuthenticated])
-def payment_history(request):
+class PaymentHistoryView(generics.ListAPIView):
     """
-    Get user's payment history
+    GET: List user's payments, newest first
     """
-    payments = (
-        Payment.objects.filter(invoice__shipment__user=request.user)
-        .select_related("invoice", "invoice__shipment")
-        .order_by("-created_at")
-    )
 
-    serializer = PaymentSerializer(payments, many=True)
-    return Response(serializer.data)
+    permission_classes = [IsAuthenticated]
+    serializer_class = PaymentSerializer
+
+    def get_queryset(self):
+        return (
+            Payment.objects.filter(invoice__shipment__user=self.request.user)
+            .order_by("-created_at")
+            .values(*PAYMENT_HISTORY_VALUES)
+        )
+
+    def list(self, request, *args, **kwargs):
+        # Same shape as PaymentSerializer, without building model instances
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(payment_history_data(page))
+
+
+def _retrieve_intent_status(payment_intent_id):
+    """
+    Fetch a PaymentIntent's status from Stripe, cached for a few seconds so
+    repeated polling doesn't pay a Stripe round-trip each time. Terminal
+    statuses aren't cached; the local payment is updated to match instead
+    """
+    cache_key = f"pi:{payment_intent_id}"
+    intent_status = cache.get(cache_key)
+    if intent_status is None:
+        intent_status = stripe.PaymentIntent.retrieve(payment_intent_id).status
+        if intent_status not in TERMINAL_INTENT_STATUSES.values():
+            cache.set(cache_key, intent_status, INTENT_STATUS_CACHE_TIMEOUT)
+    return intent_status
 
 
 @api_view(["GET"])
@@ -130,44 +158,34 @@ def payment_status(request, payment_intent_id):
     Get payment status from Stripe
     """
     try:
-        payment = Payment.objects.get(
+        payment = Payment.objects.select_related(
+            "invoice", "invoice__shipment"
+        ).get(
             stripe_payment_intent_id=payment_intent_id,
             invoice__shipment__user=request.user,
         )
 
-        # Get latest status from Stripe
-        intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+        # Terminal payments can't change, so there's nothing to ask Stripe
+        intent_status = TERMINAL_INTENT_STATUSES.get(payment.status)
+        if intent_status is None:
+            intent_status = _retrieve_intent_status(payment_intent_id)
 
         # Update local status if different
-        stripe_status_map = {
-            "requires_payment_method": "failed",
-            "requires_confirmation": "pending",
-            "requires_action": "requires_action",
-            "processing": "processing",
-            "succeeded": "succeeded",
-            "canceled": "cancelled",
-        }
-
-        new_status = stripe_status_map.get(intent.status, "pending")
+        new_status = STRIPE_STATUS_MAP.get(intent_status, "pending")
         if payment.status != new_status:
-            payment.status = new_status
-            payment.save()
-
             # Handle successful payment
             if new_status == "succeeded" and payment.invoice.status != "paid":
-                payment.invoice.status = "paid"
-                payment.invoice.paid_at = timezone.now()
-                payment.invoice.save()
-
-                payment.invoice.shipment.status = "inprogress"
-                payment.invoice.shipment.save()
+                payment.mark_succeeded()
+            else:
+                payment.status = new_status
+                payment.save(update_fields=["status", "updated_at"])
 
         return Response(
             {
                 "payment_intent_id": payment_intent_id,
-                "status": intent.status,
+                "status": intent_status,
                 "local_status": payment.status,
-                "requires_action": intent.status
+                "requires_action": intent_status
                 in ["requires_action", "requires_source_action"],
             }
         )
@@ -192,54 +210,17 @@ def stripe_webhook(request):
     try:
         event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
     except ValueError:
-        return Response({"error": "Invalid payload"}, status=400)
+        return HttpResponseBadRequest(
+            b'{"error": "Invalid payload"}', content_type="application/json"
+        )
     except stripe.error.SignatureVerificationError:
-        return Response({"error": "Invalid signature"}, status=400)
-
-    # Handle the event
-    if event["type"] == "payment_intent.succeeded":
-        payment_intent = event["data"]["object"]
-
-        try:
-            payment = Payment.objects.get(stripe_payment_intent_id=payment_intent["id"])
-            payment.status = "succeeded"
-            payment.save()
-
-            # Update invoice and shipment
-            invoice = payment.invoice
-            invoice.status = "paid"
-            invoice.paid_at = timezone.now()
-            invoice.save()
-
-            invoice.shipment.status = "inprogress"
-            invoice.shipment.save()
-
-        except Payment.DoesNotExist:
-            pass
-
-    elif event["type"] == "payment_intent.payment_failed":
-        payment_intent = event["data"]["object"]
-
-        try:
-            payment = Payment.objects.get(stripe_payment_intent_id=payment_intent["id"])
-            payment.status = "failed"
-            payment.failure_reason = payment_intent.get("last_payment_error", {}).get(
-                "message", "Unknown error"
-            )
-            payment.save()
-
-        except Payment.DoesNotExist:
-            pass
-
-    elif event["type"] == "payment_intent.requires_action":
-        payment_intent = event["data"]["object"]
-
-        try:
-            payment = Payment.objects.get(stripe_payment_intent_id=payment_intent["id"])
-            payment.status = "requires_action"
-            payment.save()
+        return HttpResponseBadRequest(
+            b'{"error": "Invalid signature"}', content_type="application/json"
+        )
 
-        except Payment.DoesNotExist:
-            pass
+    # Apply the event before acking: if it fails, the error response makes
+    # Stripe redeliver it instead of losing the update
+    process_stripe_event(event["id"], event["type"], event["data"]["object"])
 
-    return Response({"status": "success"})
+    # Stripe only looks at the status code, so skip DRF's renderer
+    return HttpResponse(status=200)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ShipperConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shipper'
+
+    def ready(self):
+        # Connect the price cache invalidation signals
+        from shipper.util import get_price_calculation  # noqa: F401
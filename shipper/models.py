@@ -126,6 +126,12 @@ class Shipment(models.Model):
         ordering = ["-created_at"]
         db_table = "shipments"
         verbose_name_plural = "shipments"
+        indexes = [
+            # User's shipment lists, newest first
+            models.Index(fields=["user", "-created_at"]),
+            # The same lists filtered by status
+            models.Index(fields=["user", "status", "-created_at"]),
+        ]
 
     def __str__(self):
         return f"Shipment {self.id}"
@@ -191,6 +197,8 @@ class Location(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
+        # The unique index on (shipment, location_type) also serves the
+        # per-shipment pickup/dropoff lookups; no separate index is needed
         unique_together = ["shipment", "location_type"]
         db_table = "locations"
         verbose_name_plural = "locations"
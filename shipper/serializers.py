@@ -1,7 +1,11 @@
 import re
 
+from django.db import transaction
+from django.db.models import Case, CharField, TextField, Value, When
 from rest_framework import serializers
 
+from shipper.util.get_price_calculation import get_price_calculation
+
 from .models import (
     City,
     Location,
@@ -10,6 +14,45 @@ from .models import (
     ShippingNeeds,
 )
 
+_PHONE_RE = re.compile(r"^\+?[1-9]\d{8,14}$")
+_ZIP_RE = re.compile(r"^\d{5}(?:[-\s]\d{4})?$")
+
+
+class _PickupDropoffMixin:
+    """pickup/dropoff fields shared by the shipment serializers"""
+
+    def _split(self, obj):
+        """
+        Return (pickup, dropoff) for a shipment in a single pass over its
+        locations, prefetched into _locs by shipper.views.with_locations
+        (queried otherwise), memoized per shipment on the serializer
+        """
+        cache = self.__dict__.setdefault("_locations_by_shipment", {})
+        if obj.id not in cache:
+            locations = getattr(obj, "_locs", None)
+            if locations is None:
+                locations = obj.locations.all()
+            pickup = dropoff = None
+            for location in locations:
+                if location.location_type == "pickup":
+                    pickup = location
+                elif location.location_type == "dropoff":
+                    dropoff = location
+            cache[obj.id] = (pickup, dropoff)
+        return cache[obj.id]
+
+    def get_pickup(self, obj):
+        pickup, _ = self._split(obj)
+        if not pickup:
+            return None
+        return ListLocationSerializer(pickup).data
+
+    def get_dropoff(self, obj):
+        _, dropoff = self._split(obj)
+        if not dropoff:
+            return None
+        return ListLocationSerializer(dropoff).data
+
 
 class LocationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -32,22 +75,25 @@ class LocationSerializer(serializers.ModelSerializer):
 
     def validate_phone_number(self, value):
         if value:
-            # Basic phone number validation
-            phone_pattern = r"^\+?[1-9]\d{8,14}$"
-            if not re.match(phone_pattern, value):
+            # Basic phone number validation; the length check rejects most
+            # bad input before the regex runs
+            if not (9 <= len(value) <= 16 and _PHONE_RE.match(value)):
                 raise serializers.ValidationError("Invalid phone number format")
         return value
 
     def validate_zip_code(self, value):
         if value:
-            # US ZIP code validation
-            zip_pattern = r"^\d{5}(?:[-\s]\d{4})?$"
-            if not re.match(zip_pattern, value):
+            # US ZIP code validation, with a cheap shape check first
+            if not (
+                len(value) in (5, 10)
+                and value[:5].isdecimal()
+                and _ZIP_RE.match(value)
+            ):
                 raise serializers.ValidationError("Invalid ZIP code format")
         return value
 
 
-class ShipmentListSerializer(serializers.ModelSerializer):
+class ShipmentListSerializer(_PickupDropoffMixin, serializers.ModelSerializer):
     """Serializer for listing shipments with pickup and dropoff info"""
 
     total_price = serializers.ReadOnlyField()
@@ -70,20 +116,110 @@ class ShipmentListSerializer(serializers.ModelSerializer):
             "created_at",
         ]
 
-    def get_pickup(self, obj):
-        pickup = obj.locations.filter(location_type="pickup").first()
-        if not pickup:
-            return None
-        return ListLocationSerializer(pickup).data
 
-    def get_dropoff(self, obj):
-        dropoff = obj.locations.filter(location_type="dropoff").first()
-        if not dropoff:
-            return None
-        return ListLocationSerializer(dropoff).data
+# Field instances reused to format values() rows the way the serializers do
+_DATE_FIELD = serializers.DateField()
+_DATETIME_FIELD = serializers.DateTimeField()
+_PRICE_FIELD = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+SHIPMENT_LIST_VALUES = (
+    "id",
+    "status",
+    "base_price",
+    "driver_assist",
+    "driver_assist_fee",
+    "miles",
+    "equipment",
+    "created_at",
+)
+_LOCATION_LIST_VALUES = (
+    "shipment_id",
+    "location_type",
+    "facility_name",
+    "facility_address",
+    "city__id",
+    "city__name",
+    "city__region_code",
+    "zip_code",
+    "date",
+    "contact_name",
+    "phone_number",
+    "email",
+    "scheduling_preference",
+    "location_number",
+    "additional_notes",
+)
+
+
+def _location_list_data(row):
+    """ListLocationSerializer's output for a location values() row"""
+    return {
+        "location_type": row["location_type"],
+        "facility_name": row["facility_name"],
+        "facility_address": row["facility_address"],
+        "city": {
+            "id": row["city__id"],
+            "name": row["city__name"],
+            "region_code": row["city__region_code"],
+        },
+        "zip_code": row["zip_code"],
+        "date": _DATE_FIELD.to_representation(row["date"]),
+        "contact_name": row["contact_name"],
+        "phone_number": row["phone_number"],
+        "email": row["email"],
+        "scheduling_preference": row["scheduling_preference"],
+        "location_number": row["location_number"],
+        "additional_notes": row["additional_notes"],
+    }
+
+
+def shipment_list_data(rows):
+    """
+    ShipmentListSerializer's output for values(*SHIPMENT_LIST_VALUES) rows,
+    without building model or serializer instances per shipment. Locations
+    for all rows come from one query
+    """
+    rows = list(rows)
+    locations = {}
+    if rows:
+        for row in Location.objects.filter(
+            shipment_id__in=[row["id"] for row in rows]
+        ).values(*_LOCATION_LIST_VALUES):
+            locations.setdefault(row["shipment_id"], {})[row["location_type"]] = (
+                _location_list_data(row)
+            )
+
+    data = []
+    for row in rows:
+        base_price = row["base_price"]
+        shipment_locations = locations.get(row["id"], {})
+        data.append(
+            {
+                "id": row["id"],
+                "status": row["status"],
+                "pickup": shipment_locations.get("pickup"),
+                "dropoff": shipment_locations.get("dropoff"),
+                "base_price": (
+                    _PRICE_FIELD.to_representation(base_price)
+                    if base_price is not None
+                    else None
+                ),
+                # Same rule as Shipment.total_price
+                "total_price": (
+                    base_price
+                    + (row["driver_assist_fee"] if row["driver_assist"] else 0)
+                    if base_price
+                    else 0
+                ),
+                "miles": row["miles"],
+                "equipment": row["equipment"],
+                "created_at": _DATETIME_FIELD.to_representation(row["created_at"]),
+            }
+        )
+    return data
 
 
-class ShipmentDetailSerializer(serializers.ModelSerializer):
+class ShipmentDetailSerializer(_PickupDropoffMixin, serializers.ModelSerializer):
     """Detailed serializer for shipment CRUD operations"""
 
     total_price = serializers.ReadOnlyField()
@@ -114,18 +250,6 @@ class ShipmentDetailSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id", "user", "created_at", "updated_at"]
 
-    def get_pickup(self, obj):
-        pickup = obj.locations.filter(location_type="pickup").first()
-        if not pickup:
-            return None
-        return ListLocationSerializer(pickup).data
-
-    def get_dropoff(self, obj):
-        dropoff = obj.locations.filter(location_type="dropoff").first()
-        if not dropoff:
-            return None
-        return ListLocationSerializer(dropoff).data
-
     def validate(self, data):
         """Cross-field validation"""
         pickup_date = data.get("pickup_date")
@@ -176,40 +300,41 @@ class ShipmentCreateSerializer(serializers.ModelSerializer):
         pickup_city = pickup_data["city"]
         dropoff_city = dropoff_data["city"]
         try:
-            price_data = PriceCalculation.objects.get(
-                pickup_location=pickup_city,
-                dropoff_location=dropoff_city,
-                equipment=equipment,
+            base_price, miles, min_transit_time = get_price_calculation(
+                pickup_city.id, dropoff_city.id, equipment
             )
         except PriceCalculation.DoesNotExist:
             raise serializers.ValidationError(
                 "Price calculation for this route and equipment does not exist."
             )
 
-        # Create Shipment
-        shipment = Shipment.objects.create(
-            user=self.context["request"].user,
-            **validated_data,
-            base_price=price_data.base_price,
-            miles=price_data.miles,
-            min_transit_time=price_data.min_transit_time,
-        )
-
-        # Create Pickup Location
-        Location.objects.create(
-            shipment=shipment,
-            location_type="pickup",
-            city=pickup_data["city"],
-            date=pickup_data["date"],
-        )
+        with transaction.atomic():
+            # Create Shipment
+            shipment = Shipment.objects.create(
+                user=self.context["request"].user,
+                **validated_data,
+                base_price=base_price,
+                miles=miles,
+                min_transit_time=min_transit_time,
+            )
 
-        # Create Dropoff Location
-        Location.objects.create(
-            shipment=shipment,
-            location_type="dropoff",
-            city=dropoff_data["city"],
-            date=dropoff_data["date"],
-        )
+            # Create Pickup and Dropoff Locations in one INSERT
+            Location.objects.bulk_create(
+                [
+                    Location(
+                        shipment=shipment,
+                        location_type="pickup",
+                        city=pickup_data["city"],
+                        date=pickup_data["date"],
+                    ),
+                    Location(
+                        shipment=shipment,
+                        location_type="dropoff",
+                        city=dropoff_data["city"],
+                        date=dropoff_data["date"],
+                    ),
+                ]
+            )
 
         return shipment
 
@@ -228,28 +353,35 @@ class ShipmentUpdateStep2Serializer(serializers.ModelSerializer):
             "dropoff",
         ]
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         # Extract location data
         pickup_data = validated_data.pop("pickup", None)
         dropoff_data = validated_data.pop("dropoff", None)
 
-        # Update shipment fields
+        # Update shipment fields, tracking which ones actually change
+        changed = set()
         for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
-        # Update or create location objects
-        if pickup_data:
-            pickup_data["location_type"] = "pickup"
-            pickup_location, created = Location.objects.update_or_create(
-                shipment=instance, location_type="pickup", defaults=pickup_data
-            )
-
-        if dropoff_data:
-            dropoff_data["location_type"] = "dropoff"
-            dropoff_location, created = Location.objects.update_or_create(
-                shipment=instance, location_type="dropoff", defaults=dropoff_data
-            )
+            if getattr(instance, attr) != value:
+                setattr(instance, attr, value)
+                changed.add(attr)
+
+        if changed:
+            instance.save(update_fields=[*changed, "updated_at"])
+
+        # Update or create location objects: a single UPDATE of the fields
+        # given, inserting only when the shipment has no such location yet
+        for location_type, location_data in (
+            ("pickup", pickup_data),
+            ("dropoff", dropoff_data),
+        ):
+            if location_data:
+                location_data["location_type"] = location_type
+                updated = Location.objects.filter(
+                    shipment=instance, location_type=location_type
+                ).update(**location_data)
+                if not updated:
+                    Location.objects.create(shipment=instance, **location_data)
 
         return instance
 
@@ -286,6 +418,7 @@ class ShipmentUpdateStep3Serializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Packaging count must be at least 1")
         return value
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         # Extract location-specific data
         pickup_number = validated_data.pop("pickup_number", None)
@@ -293,34 +426,53 @@ class ShipmentUpdateStep3Serializer(serializers.ModelSerializer):
         dropoff_number = validated_data.pop("dropoff_number", None)
         dropoff_notes = validated_data.pop("dropoff_notes", None)
 
-        # Update shipment fields
+        # Update shipment fields, tracking which ones actually change
+        changed = set()
         for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+            if getattr(instance, attr) != value:
+                setattr(instance, attr, value)
+                changed.add(attr)
 
         # Mark as in progress if all required fields are filled
-        if all(
-            [
-                instance.reference_number,
-                instance.weight,
-                instance.commodity,
-                instance.packaging,
-                instance.packaging_type,
-            ]
+        if (
+            instance.reference_number
+            and instance.weight
+            and instance.commodity
+            and instance.packaging
+            and instance.packaging_type
+            and instance.status != "upcoming"
         ):
             instance.status = "upcoming"
+            changed.add("status")
 
-        instance.save()
+        if changed:
+            instance.save(update_fields=[*changed, "updated_at"])
 
-        # Update location details
+        # Update location details, both locations in a single UPDATE
+        location_updates = {}
         if pickup_number or pickup_notes:
-            Location.objects.filter(shipment=instance, location_type="pickup").update(
-                location_number=pickup_number or "", additional_notes=pickup_notes or ""
-            )
-
+            location_updates["pickup"] = (pickup_number or "", pickup_notes or "")
         if dropoff_number or dropoff_notes:
-            Location.objects.filter(shipment=instance, location_type="dropoff").update(
-                location_number=dropoff_number or "",
-                additional_notes=dropoff_notes or "",
+            location_updates["dropoff"] = (dropoff_number or "", dropoff_notes or "")
+
+        if location_updates:
+            Location.objects.filter(
+                shipment=instance, location_type__in=location_updates
+            ).update(
+                location_number=Case(
+                    *[
+                        When(location_type=location_type, then=Value(number))
+                        for location_type, (number, _) in location_updates.items()
+                    ],
+                    output_field=CharField(),
+                ),
+                additional_notes=Case(
+                    *[
+                        When(location_type=location_type, then=Value(notes))
+                        for location_type, (_, notes) in location_updates.items()
+                    ],
+                    output_field=TextField(),
+                ),
             )
 
         return instance
@@ -351,19 +503,6 @@ class DistancePriceRequestSerializer(serializers.Serializer):
     )
 
 
-class DistancePriceResponseSerializer(serializers.Serializer):
-    """Serializer for distance/price calculation response"""
-
-    pickup_location = serializers.CharField()
-    dropoff_location = serializers.CharField()
-    equipment = serializers.CharField()
-    miles = serializers.IntegerField()
-    base_price = serializers.DecimalField(max_digits=10, decimal_places=2)
-    min_transit_time = serializers.IntegerField()
-    driver_assist_fee = serializers.DecimalField(max_digits=10, decimal_places=2)
-    total_price_with_assist = serializers.DecimalField(max_digits=10, decimal_places=2)
-
-
 class ShippingNeedsSerializer(serializers.ModelSerializer):
     company_location = serializers.CharField(write_only=True)
     mode = serializers.ListField(child=serializers.CharField())
@@ -1,3 +1,72 @@
+import datetime
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import User
+
+from .models import City, Location, Shipment
+from .serializers import (
+    SHIPMENT_LIST_VALUES,
+    ShipmentListSerializer,
+    shipment_list_data,
+)
+
+
+class ShipmentListDataTests(TestCase):
+    """shipment_list_data must keep ShipmentListSerializer's output"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="shipper", email="shipper@example.com", password="pw"
+        )
+        chicago = City.objects.create(id=1, name="Chicago", region_code="IL")
+        dallas = City.objects.create(id=2, name="Dallas", region_code="TX")
+
+        # Priced, with driver assist and both locations
+        full = Shipment.objects.create(
+            user=cls.user,
+            base_price=Decimal("1234.50"),
+            driver_assist=True,
+            miles=800,
+            equipment="reefer",
+        )
+        Location.objects.create(
+            shipment=full,
+            location_type="pickup",
+            city=chicago,
+            facility_name="North Dock",
+            zip_code="60601",
+            date=datetime.date(2026, 1, 5),
+            phone_number="+13125550100",
+        )
+        Location.objects.create(
+            shipment=full,
+            location_type="dropoff",
+            city=dallas,
+            scheduling_preference="already_scheduled",
+            additional_notes="Call ahead",
+        )
+
+        # Priced without driver assist, pickup only
+        partial = Shipment.objects.create(
+            user=cls.user, base_price=Decimal("600.00"), miles=40
+        )
+        Location.objects.create(shipment=partial, location_type="pickup", city=dallas)
+
+        # No price and no locations yet
+        Shipment.objects.create(user=cls.user)
+
+    def test_matches_serializer(self):
+        shipments = Shipment.objects.filter(user=self.user).order_by(
+            "-created_at", "id"
+        )
+
+        self.assertEqual(
+            shipment_list_data(shipments.values(*SHIPMENT_LIST_VALUES)),
+            ShipmentListSerializer(shipments, many=True).data,
+        )
+
+    def test_empty(self):
+        self.assertEqual(shipment_list_data([]), [])
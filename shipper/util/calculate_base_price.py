@@ -1,18 +1,21 @@
 from decimal import Decimal
 
+BASE_RATE_PER_MILE = Decimal("2.50")
+BASE_FEE = Decimal("500.00")  # Minimum fee
 
-def calculate_base_price(miles, equipment):
-    """Calculate base price based on distance and equipment type"""
-    base_rate_per_mile = Decimal("2.50")
+# Equipment multiplier
+EQUIPMENT_MULTIPLIERS = {
+    "dryVan": Decimal("1.0"),
+    "reefer": Decimal("1.3"),  # Reefer costs more
+}
+DEFAULT_MULTIPLIER = Decimal("1.0")
+
+DRIVER_ASSIST_FEE = Decimal("150.00")
 
-    # Equipment multiplier
-    equipment_multipliers = {
-        "dryVan": Decimal("1.0"),
-        "reefer": Decimal("1.3"),  # Reefer costs more
-    }
 
-    multiplier = equipment_multipliers.get(equipment, Decimal("1.0"))
-    base_fee = Decimal("500.00")  # Minimum fee
+def calculate_base_price(miles, equipment):
+    """Calculate base price based on distance and equipment type"""
+    multiplier = EQUIPMENT_MULTIPLIERS.get(equipment, DEFAULT_MULTIPLIER)
 
-    calculated_price = (Decimal(miles) * base_rate_per_mile * multiplier) + base_fee
+    calculated_price = (Decimal(miles) * BASE_RATE_PER_MILE * multiplier) + BASE_FEE
     return round(calculated_price, 2)
@@ -1,4 +1,6 @@
-from math import radians, cos, sin, sqrt, atan2
+from math import asin, cos, radians, sin, sqrt
+
+R = 3958.8  # Radius of Earth in miles
 
 
 def calculate_distance(pickup, dropoff):
@@ -7,18 +9,17 @@ def calculate_distance(pickup, dropoff):
     Input: pickup and dropoff are dictionaries with latitude and longitude
     Returns: distance in miles
     """
-    R = 3958.8  # Radius of Earth in miles
-
     lat1 = radians(pickup["latitude"])
     lon1 = radians(pickup["longitude"])
     lat2 = radians(dropoff["latitude"])
     lon2 = radians(dropoff["longitude"])
 
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
+    half_dlat = (lat2 - lat1) * 0.5
+    half_dlon = (lon2 - lon1) * 0.5
 
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    a = sin(half_dlat) ** 2 + cos(lat1) * cos(lat2) * sin(half_dlon) ** 2
+    # 2*asin(sqrt(a)) equals 2*atan2(sqrt(a), sqrt(1 - a)) with one fewer
+    # sqrt; min() guards against a rounding just past 1 for antipodal points
+    c = 2 * asin(min(1.0, sqrt(a)))
 
-    distance = R * c
-    return round(distance, 2)
+    return round(R * c, 2)
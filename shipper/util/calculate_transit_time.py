@@ -1,8 +1,7 @@
-import math
+MILES_PER_DAY = 500  # Average speed including stops
 
 
 def calculate_transit_time(miles):
     """Calculate minimum transit time in days based on distance"""
-    # Assume average speed of 500 miles per day including stops
-    days = math.ceil(miles / 500)
-    return max(1, days)
+    # Ceiling division without math.ceil; a zero-day trip still takes a day
+    return int(-(-miles // MILES_PER_DAY)) or 1
@@ -1,27 +1,32 @@
 from shipper.models import City
 
 
-def get_or_create_city(city_data):
-    city_id = city_data["id"]
+def _city_defaults(city_data):
+    return {
+        "name": city_data["name"],
+        "region_code": city_data.get("region_code", ""),
+        "country_code": city_data.get("country_code", ""),
+        "latitude": city_data.get("latitude"),
+        "longitude": city_data.get("longitude"),
+    }
 
-    try:
-        return City.objects.get(id=city_id)
-    except City.DoesNotExist:
-        # Extract required fields
-        name = city_data["name"]
-        region_code = city_data.get(
-            "region_code",
-        )
-        country_code = city_data.get("country_code")
-        latitude = city_data.get("latitude")
-        longitude = city_data.get("longitude")
 
-        # Create city in DB
-        return City.objects.create(
-            id=city_id,
-            name=name,
-            region_code=region_code,
-            country_code=country_code,
-            latitude=latitude,
-            longitude=longitude,
-        )
+def get_or_create_cities(cities_data):
+    """
+    Resolve several cities with one SELECT, plus one INSERT for any that
+    are new. Cities another request inserts first are kept as they are
+    Returns: {city_id: City}
+    """
+    cities = City.objects.in_bulk([int(city_data["id"]) for city_data in cities_data])
+
+    missing = {}
+    for city_data in cities_data:
+        city_id = int(city_data["id"])
+        if city_id not in cities and city_id not in missing:
+            missing[city_id] = City(id=city_id, **_city_defaults(city_data))
+
+    if missing:
+        City.objects.bulk_create(missing.values(), ignore_conflicts=True)
+        cities.update(missing)
+
+    return cities
@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from shipper.models import PriceCalculation
+
+PRICE_RESPONSE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def price_response_cache_key(pickup_id, dropoff_id, equipment):
+    """Cache key for a route's distance/price response"""
+    return f"pc:{pickup_id}:{dropoff_id}:{equipment}"
+
+
+def _price_calculation_cache_key(pickup_id, dropoff_id, equipment):
+    return f"pcrow:{pickup_id}:{dropoff_id}:{equipment}"
+
+
+def get_price_calculation(pickup_id, dropoff_id, equipment):
+    """
+    Look up the stored price for a route, cached for
+    PRICE_RESPONSE_CACHE_TIMEOUT so an edited price reaches every worker
+    Returns: (base_price, miles, min_transit_time)
+    Raises: PriceCalculation.DoesNotExist (misses are not cached)
+    """
+    cache_key = _price_calculation_cache_key(pickup_id, dropoff_id, equipment)
+    row = cache.get(cache_key)
+    if row is None:
+        row = PriceCalculation.objects.values_list(
+            "base_price", "miles", "min_transit_time"
+        ).get(
+            pickup_location_id=pickup_id,
+            dropoff_location_id=dropoff_id,
+            equipment=equipment,
+        )
+        cache.set(cache_key, row, PRICE_RESPONSE_CACHE_TIMEOUT)
+    return row
+
+
+@receiver(post_save, sender=PriceCalculation)
+@receiver(post_delete, sender=PriceCalculation)
+def clear_price_calculation_cache(sender, instance, **kwargs):
+    # The cache is per process (no CACHES backend is configured), so this
+    # only reaches the worker that saved the row; others expire on timeout
+    route = (
+        instance.pickup_location_id,
+        instance.dropoff_location_id,
+        instance.equipment,
+    )
+    cache.delete_many(
+        [_price_calculation_cache_key(*route), price_response_cache_key(*route)]
+    )
@@ -1,34 +1,59 @@
 from datetime import timedelta
-from decimal import Decimal
 
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from accounts.serializers import UserSerializer
-from shipper.util.calculate_base_price import calculate_base_price
+from shipper.util.calculate_base_price import DRIVER_ASSIST_FEE, calculate_base_price
 from shipper.util.calculate_distance import calculate_distance
 from shipper.util.calculate_transit_time import calculate_transit_time
-from shipper.util.get_or_create_city import get_or_create_city
-from utils.geodb import geo_api_get
+from shipper.util.get_or_create_city import get_or_create_cities
+from shipper.util.get_price_calculation import (
+    PRICE_RESPONSE_CACHE_TIMEOUT,
+    get_price_calculation,
+    price_response_cache_key,
+)
+from utils.geodb import GEO_CACHE_TIMEOUT, geo_api_fetch, geo_api_get, geo_cache_key
 
 from .models import (
+    Location,
     PriceCalculation,
     Shipment,
 )
 from .serializers import (
+    SHIPMENT_LIST_VALUES,
     DistancePriceRequestSerializer,
-    DistancePriceResponseSerializer,
     ShipmentCreateSerializer,
     ShipmentDetailSerializer,
     ShipmentListSerializer,
     ShipmentUpdateStep2Serializer,
     ShipmentUpdateStep3Serializer,
     ShippingNeedsSerializer,
+    shipment_list_data,
 )
 
+_VALID_STATUSES = frozenset(status for status, _ in Shipment.STATUS_CHOICES)
+
+
+def with_locations(queryset):
+    """
+    Prefetch shipments' locations (with their cities) into _locs for the
+    pickup/dropoff fields
+    """
+    return queryset.prefetch_related(
+        Prefetch(
+            "locations",
+            queryset=Location.objects.select_related("city"),
+            to_attr="_locs",
+        )
+    )
+
 
 class ShipmentListCreateView(generics.ListCreateAPIView):
     """
@@ -47,9 +72,20 @@ class ShipmentListCreateView(generics.ListCreateAPIView):
         queryset = Shipment.objects.filter(user=self.request.user)
         status_filter = self.request.query_params.get("status", None)
         if status_filter:
+            # An unknown status can't match anything, so don't query for it
+            if status_filter not in _VALID_STATUSES:
+                return queryset.none()
             queryset = queryset.filter(status=status_filter)
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        # Read only the listed columns as dicts; the rows come out in
+        # ShipmentListSerializer's shape without a serializer per shipment
+        page = self.paginate_queryset(
+            self.get_queryset().values(*SHIPMENT_LIST_VALUES)
+        )
+        return self.get_paginated_response(shipment_list_data(page))
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(
             data=request.data, context={"request": request}
@@ -74,7 +110,7 @@ class ShipmentDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ShipmentDetailSerializer
 
     def get_queryset(self):
-        return Shipment.objects.filter(user=self.request.user)
+        return with_locations(Shipment.objects.filter(user=self.request.user))
 
 
 class ShipmentUpdateStep2View(generics.UpdateAPIView):
@@ -84,7 +120,10 @@ class ShipmentUpdateStep2View(generics.UpdateAPIView):
     serializer_class = ShipmentUpdateStep2Serializer
 
     def get_queryset(self):
-        return Shipment.objects.filter(user=self.request.user)
+        # Step 2 only reads and writes driver_assist on the shipment row
+        return Shipment.objects.filter(user=self.request.user).only(
+            "id", "driver_assist"
+        )
 
 
 class ShipmentUpdateStep3View(generics.UpdateAPIView):
@@ -94,7 +133,33 @@ class ShipmentUpdateStep3View(generics.UpdateAPIView):
     serializer_class = ShipmentUpdateStep3Serializer
 
     def get_queryset(self):
-        return Shipment.objects.filter(user=self.request.user)
+        # The Step 3 fields plus status, which the update may promote
+        return Shipment.objects.filter(user=self.request.user).only(
+            "id",
+            "status",
+            "reference_number",
+            "weight",
+            "commodity",
+            "packaging",
+            "packaging_type",
+        )
+
+
+def _distance_price_data(pickup, dropoff, equipment, miles, base_price, transit):
+    """
+    Build the distance/price response by hand; every value is already
+    validated, so a response serializer would only add per-call overhead
+    """
+    return {
+        "pickup_location": str(pickup),
+        "dropoff_location": str(dropoff),
+        "equipment": equipment,
+        "miles": int(miles),
+        "base_price": str(base_price),
+        "min_transit_time": int(transit),
+        "driver_assist_fee": str(DRIVER_ASSIST_FEE),
+        "total_price_with_assist": str(base_price + DRIVER_ASSIST_FEE),
+    }
 
 
 @api_view(["POST"])
@@ -114,58 +179,62 @@ def calculate_distance_price(request):
     dropoff_location_data = serializer.validated_data["dropoff_location"]
     equipment = serializer.validated_data["equipment"]
     try:
-        pickup_city = get_or_create_city(pickup_location_data)
-        dropoff_city = get_or_create_city(dropoff_location_data)
-
-        # Check if we have a cached calculation
-        cached_calculation = PriceCalculation.objects.filter(
-            pickup_location=pickup_city,
-            dropoff_location=dropoff_city,
-            equipment=equipment,
-        ).first()
-
-        if cached_calculation:
-            response_data = {
-                "pickup_location": pickup_city,
-                "dropoff_location": dropoff_city,
-                "equipment": equipment,
-                "miles": cached_calculation.miles,
-                "base_price": cached_calculation.base_price,
-                "min_transit_time": cached_calculation.min_transit_time,
-                "driver_assist_fee": Decimal("150.00"),
-                "total_price_with_assist": cached_calculation.base_price
-                + Decimal("150.00"),
-            }
-            response_serializer = DistancePriceResponseSerializer(response_data)
-            return Response(response_serializer.data)
-
-        distance_miles = calculate_distance(pickup_location_data, dropoff_location_data)
-        base_price = calculate_base_price(distance_miles, equipment)
-        min_transit_days = calculate_transit_time(distance_miles)
-
-        # Cache the calculation
-        PriceCalculation.objects.create(
-            pickup_location=pickup_city,
-            dropoff_location=dropoff_city,
-            equipment=equipment,
-            miles=distance_miles,
-            base_price=base_price,
-            min_transit_time=min_transit_days,
+        # Known routes are answered from the cache before any query
+        cache_key = price_response_cache_key(
+            int(pickup_location_data["id"]),
+            int(dropoff_location_data["id"]),
+            equipment,
         )
-
-        response_data = {
-            "pickup_location": pickup_location_data,
-            "dropoff_location": dropoff_location_data,
-            "equipment": equipment,
-            "miles": distance_miles,
-            "base_price": base_price,
-            "min_transit_time": min_transit_days,
-            "driver_assist_fee": Decimal("150.00"),
-            "total_price_with_assist": base_price + Decimal("150.00"),
-        }
-
-        response_serializer = DistancePriceResponseSerializer(response_data)
-        return Response(response_serializer.data)
+        response_data = cache.get(cache_key)
+        if response_data is not None:
+            return Response(response_data)
+
+        # One transaction for the route's writes: new cities and the new price
+        # commit together, and a failed price write leaves no orphan cities
+        with transaction.atomic():
+            cities = get_or_create_cities([pickup_location_data, dropoff_location_data])
+            pickup_city = cities[int(pickup_location_data["id"])]
+            dropoff_city = cities[int(dropoff_location_data["id"])]
+
+            # Check if we have a cached calculation
+            try:
+                base_price, miles, min_transit_time = get_price_calculation(
+                    pickup_city.id, dropoff_city.id, equipment
+                )
+            except PriceCalculation.DoesNotExist:
+                distance_miles = calculate_distance(
+                    pickup_location_data, dropoff_location_data
+                )
+                base_price = calculate_base_price(distance_miles, equipment)
+                min_transit_time = calculate_transit_time(distance_miles)
+                # The whole miles the integer column stores (IntegerField
+                # truncates with int())
+                miles = int(distance_miles)
+
+                # Cache the calculation in one INSERT ... ON CONFLICT DO
+                # NOTHING; a concurrent miss on the same route keeps the row
+                # already stored, which holds the same values. Misses are
+                # never cached, so skipping post_save leaves nothing stale
+                PriceCalculation.objects.bulk_create(
+                    [
+                        PriceCalculation(
+                            pickup_location=pickup_city,
+                            dropoff_location=dropoff_city,
+                            equipment=equipment,
+                            miles=miles,
+                            base_price=base_price,
+                            min_transit_time=min_transit_time,
+                        )
+                    ],
+                    ignore_conflicts=True,
+                )
+
+        # Stored and newly computed routes render the same way
+        response_data = _distance_price_data(
+            pickup_city, dropoff_city, equipment, miles, base_price, min_transit_time
+        )
+        cache.set(cache_key, response_data, PRICE_RESPONSE_CACHE_TIMEOUT)
+        return Response(response_data)
 
     except Exception as e:
         return Response(
@@ -177,32 +246,53 @@ def calculate_distance_price(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_regions(request):
-    serializer = UserSerializer(request.user)
-    country_code = serializer.data["company"]["primary_ships_country"]
+    country_code = request.user.company.primary_ships_country
     name_prefix = request.GET.get("name", "")
     try:
         data = geo_api_get(
             f"countries/{country_code}/regions", params={"namePrefix": name_prefix}
         )
-        return Response(
+        response = Response(
             data.get("data", []),
         )
+        # Regions follow the user's company country, so only their browser
+        # may reuse the response
+        patch_cache_control(response, private=True, max_age=GEO_CACHE_TIMEOUT)
+        return response
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _public_geo_response(data):
+    """
+    Response for user-independent GeoDB data; browsers and shared caches
+    may serve repeated lookups without reaching the view
+    """
+    response = Response(data)
+    patch_cache_control(response, public=True, max_age=GEO_CACHE_TIMEOUT)
+    return response
+
+
 @api_view(["GET"])
 @permission_classes([permissions.AllowAny])
 def search_cities(request):
     name_prefix = request.GET.get("name_prefix", "")
+
+    # Autocomplete repeats prefixes; serve them without the upstream call or
+    # the transform. GeoDB prefix matching ignores case, so the key does too
+    cache_key = geo_cache_key("geocities", name_prefix.lower())
+    transformed_data = cache.get(cache_key)
+    if transformed_data is not None:
+        return _public_geo_response(transformed_data)
+
     try:
-        response = geo_api_get("cities", params={"namePrefix": name_prefix})
+        # Only the transformed list is cached, under cache_key above
+        response = geo_api_fetch("cities", params={"namePrefix": name_prefix})
         raw_data = response.get("data", [])
 
         # Transform the data
-        transformed_data = []
-        for item in raw_data:
-            transformed_item = {
+        transformed_data = [
+            {
                 "id": item.get("id"),
                 "name": item.get("name"),
                 "city": item.get("city"),
@@ -211,9 +301,11 @@ def search_cities(request):
                 "latitude": item.get("latitude"),
                 "longitude": item.get("longitude"),
             }
-            transformed_data.append(transformed_item)
+            for item in raw_data
+        ]
 
-        return Response(transformed_data)
+        cache.set(cache_key, transformed_data, GEO_CACHE_TIMEOUT)
+        return _public_geo_response(transformed_data)
 
     except Exception as e:
         return Response(
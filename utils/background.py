@@ -0,0 +1,26 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="background")
+
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Run func(*args, **kwargs) on a shared worker thread so slow external
+    calls (email, Stripe) don't hold up the response. Errors are logged
+    """
+
+    def run():
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception("Background task %s failed", func.__name__)
+        finally:
+            # Worker threads hold their own DB connections
+            close_old_connections()
+
+    return _executor.submit(run)
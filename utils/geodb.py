@@ -1,13 +1,57 @@
+from hashlib import blake2b
+from urllib.parse import urlencode
+
 import requests
 from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
 
+GEO_CACHE_TIMEOUT = 60 * 60 * 24  # GeoDB place data is effectively static
+GEO_TIMEOUT = (3, 10)  # (connect, read) seconds; never hang a worker on GeoDB
 
-def geo_api_get(endpoint, params=None):
-    url = f"{settings.GEODB_BASE_URL}/{endpoint}"
-    headers = {
+# One session for the process, so requests reuse keep-alive connections
+# instead of a new TCP/TLS handshake each time
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=50))
+_session.headers.update(
+    {
         "X-RapidAPI-Key": settings.GEODB_API_KEY,
         "X-RapidAPI-Host": settings.GEODB_API_HOST,
     }
-    response = requests.get(url, headers=headers, params=params)
+)
+
+
+def geo_cache_key(prefix, value):
+    """
+    Cache key for user-supplied lookup text; hashed so spaces, non-ASCII and
+    long input stay within what every cache backend accepts
+    """
+    return f"{prefix}:{blake2b(value.encode(), digest_size=16).hexdigest()}"
+
+
+def geo_api_fetch(endpoint, params=None):
+    """
+    GET a GeoDB endpoint without caching; for callers that cache their own
+    transformed result
+    """
+    url = f"{settings.GEODB_BASE_URL}/{endpoint}"
+    response = _session.get(url, params=params, timeout=GEO_TIMEOUT)
     response.raise_for_status()
     return response.json()
+
+
+def geo_api_get(endpoint, params=None):
+    """
+    GET a GeoDB endpoint, caching the JSON response per endpoint and params
+    """
+    cache_key = geo_cache_key(
+        "geo", f"{endpoint}?{urlencode(sorted((params or {}).items()))}"
+    )
+    data = cache.get(cache_key)
+    if data is not None:
+        return data
+
+    data = geo_api_fetch(endpoint, params=params)
+
+    cache.set(cache_key, data, GEO_CACHE_TIMEOUT)
+    return data